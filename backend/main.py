@@ -1,13 +1,28 @@
+import hmac
 import os
-from datetime import datetime, date
-from typing import List, Optional
-
-from fastapi import FastAPI, HTTPException
+import secrets
+from datetime import datetime, date, timedelta
+from typing import Annotated, List, Optional
+
+from fastapi import FastAPI, HTTPException, Path, Query
+from fastapi.encoders import ENCODERS_BY_TYPE
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from pydantic import AfterValidator, BaseModel, EmailStr
 from bson import ObjectId
-
-from database import create_document, get_documents, db
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.coder import JsonCoder, JsonEncoder
+from fastapi_cache.decorator import cache
+from redis import asyncio as aioredis
+from passlib.context import CryptContext
+from jose import jwt
+
+from database import create_document, get_documents, close_client, ensure_indexes, get_client, db
 from schemas import (
     User as UserSchema,
     Subject as SubjectSchema,
@@ -16,38 +31,183 @@ from schemas import (
     Bill as BillSchema,
 )
 
-app = FastAPI(title="Enrollment System API")
+# Serialize ObjectId as str at the framework level so handlers can return
+# raw Mongo documents without per-document stringify loops
+ENCODERS_BY_TYPE[ObjectId] = str
+
+
+def _check_object_id(v: str) -> str:
+    if not ObjectId.is_valid(v):
+        raise ValueError("Invalid ObjectId")
+    return v
+
+
+# Validates id fields in body models during request parsing, so handlers
+# skip the try/except around ObjectId() and invalid ids are rejected with
+# a 422. Only for body models: FastAPI 0.104 drops non-FieldInfo Annotated
+# metadata from path/query params, so the validator would silently never
+# run there — path ids use Path(pattern=OBJECT_ID_PATTERN) instead.
+ObjectIdStr = Annotated[str, AfterValidator(_check_object_id)]
+
+OBJECT_ID_PATTERN = r"^[0-9a-fA-F]{24}$"
+
+
+class MongoJsonEncoder(JsonEncoder):
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return super().default(o)
+
+
+# Built once at import; json.dumps(cls=...) would construct a fresh encoder
+# on every cache write
+_MONGO_JSON_ENCODER = MongoJsonEncoder(separators=(",", ":"))
+
+
+class MongoJsonCoder(JsonCoder):
+    """JsonCoder for fastapi-cache that can store documents with ObjectIds."""
+
+    @classmethod
+    def encode(cls, value):
+        # JsonCoder.decode expects bytes (it calls value.decode())
+        return _MONGO_JSON_ENCODER.encode(value).encode()
+
+
+# orjson (Rust + SIMD) serializes responses 2-5x faster than stdlib json,
+# which matters most on the list endpoints returning hundreds of documents
+app = FastAPI(title="Enrollment System API", default_response_class=ORJSONResponse)
+
+# An explicit origin list (CORS_ORIGINS, comma-separated) plus max_age lets
+# browsers cache preflight responses for 24h instead of re-issuing OPTIONS;
+# the "*" fallback keeps local development working out of the box
+cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["authorization", "content-type"],
+    max_age=86400,
 )
 
 
+@app.on_event("startup")
+async def startup_db():
+    # Motor connects lazily; ping so the pool is warmed up before traffic
+    if db is not None:
+        await db.command("ping")
+        await ensure_indexes()
+    # Share the pooled client via app.state for anything outside database.py
+    app.state.mongo = get_client()
+    # Cache hot read endpoints in Redis when configured; fall back to an
+    # in-process cache so the decorators still work without REDIS_URL
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        FastAPICache.init(RedisBackend(aioredis.from_url(redis_url)), prefix="enrollment-cache")
+    else:
+        FastAPICache.init(InMemoryBackend(), prefix="enrollment-cache")
+
+
+@app.on_event("shutdown")
+async def shutdown_db():
+    close_client()
+
+
 @app.get("/")
 def root():
     return {"message": "Enrollment System API running"}
 
 
+async def paginate(collection_name: str, filt: dict, limit: int, cursor: Optional[str], projection: dict = None):
+    """Keyset-paginate a collection: newest first, `cursor` is the last _id
+    of the previous page. Avoids skip()'s O(n) scan on deep pages."""
+    if cursor:
+        try:
+            filt["_id"] = {"$lt": ObjectId(cursor)}
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    docs = await get_documents(collection_name, filt, limit=limit, projection=projection, sort=[("_id", -1)])
+    next_cursor = str(docs[-1]["_id"]) if len(docs) == limit else None
+    return {"items": docs, "next_cursor": next_cursor}
+
+
+def stream_page(collection_name: str, filt: dict, limit: int, cursor: Optional[str]):
+    """Like paginate(), but serializes documents straight off the Motor
+    cursor: peak memory stays O(1) and the first bytes go out before the
+    last document is even fetched."""
+    # .limit(0) means "no limit" to MongoDB; never let a caller reinstate
+    # the unbounded responses pagination exists to prevent
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be >= 1")
+    if cursor:
+        try:
+            filt["_id"] = {"$lt": ObjectId(cursor)}
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def gen():
+        mongo_cursor = db[collection_name].find(filt).sort([("_id", -1)]).limit(limit)
+        yield b'{"items":['
+        first = True
+        count = 0
+        last_id = None
+        async for doc in mongo_cursor:
+            if not first:
+                yield b","
+            yield orjson.dumps(doc, default=str)
+            first = False
+            count += 1
+            last_id = doc["_id"]
+        next_cursor = orjson.dumps(str(last_id)) if count == limit else b"null"
+        yield b'],"next_cursor":' + next_cursor + b"}"
+
+    return StreamingResponse(gen(), media_type="application/json")
+
+
 # ---------- Auth (demo) ----------
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+# Without JWT_SECRET a random key is generated, so tokens are only valid
+# for the lifetime of this process — fine for demo setups
+JWT_SECRET = os.getenv("JWT_SECRET") or secrets.token_hex(32)
+JWT_ALGORITHM = "HS256"
+JWT_TTL = timedelta(minutes=15)
+
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
 
 @app.post("/auth/login")
-def login(payload: LoginRequest):
-    users = list(db["user"].find({"email": payload.email})) if db else []
-    if not users:
+async def login(payload: LoginRequest):
+    user = await db["user"].find_one({"email": payload.email}) if db is not None else None
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    user = users[0]
-    if user.get("password") != payload.password:
+    stored = user.get("password") or ""
+    try:
+        valid = pwd_context.verify(payload.password, stored)
+    except ValueError:
+        # Legacy plaintext rows: constant-time compare, then upgrade in place
+        valid = hmac.compare_digest(stored.encode(), payload.password.encode())
+        if valid:
+            await db["user"].update_one(
+                {"_id": user["_id"]},
+                {"$set": {"password": pwd_context.hash(payload.password)}},
+            )
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    user["_id"] = str(user["_id"])  # stringify id for frontend
-    return {"user": {k: v for k, v in user.items() if k != "password"}}
+    token = jwt.encode(
+        {"sub": str(user["_id"]), "role": user.get("role"), "exp": datetime.utcnow() + JWT_TTL},
+        JWT_SECRET,
+        algorithm=JWT_ALGORITHM,
+    )
+    return {
+        "user": {k: v for k, v in user.items() if k != "password"},
+        "access_token": token,
+        "token_type": "bearer",
+    }
 
 
 # ---------- Users (Admin) ----------
@@ -59,96 +219,105 @@ class UserCreate(BaseModel):
 
 
 @app.post("/users")
-def create_user(payload: UserCreate):
-    if db["user"].find_one({"email": payload.email}):
+async def create_user(payload: UserCreate):
+    if await db["user"].find_one({"email": payload.email}):
         raise HTTPException(status_code=400, detail="Email already in use")
-    uid = create_document("user", payload.model_dump() | {"is_active": True})
+    data = payload.model_dump() | {"password": pwd_context.hash(payload.password), "is_active": True}
+    uid = await create_document("user", data)
     return {"id": uid}
 
 
 @app.get("/users")
-def list_users(role: Optional[str] = None):
+async def list_users(role: Optional[str] = None, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     filt = {"role": role} if role else {}
-    docs = get_documents("user", filt)
-    for d in docs:
-        d["_id"] = str(d["_id"])
-        if "password" in d:
-            del d["password"]
-    return {"items": docs}
+    # Exclude the password hash server-side rather than stripping in Python
+    return await paginate("user", filt, limit, cursor, projection={"password": 0})
 
 
 # ---------- Subjects ----------
 @app.post("/subjects")
-def create_subject(subject: SubjectSchema):
-    sid = create_document("subject", subject)
+async def create_subject(subject: SubjectSchema):
+    sid = await create_document("subject", subject)
+    await FastAPICache.clear(namespace="subject")
     return {"id": sid}
 
 
 @app.get("/subjects")
-def list_subjects(faculty_id: Optional[str] = None):
+@cache(expire=60, namespace="subject", coder=MongoJsonCoder)
+async def list_subjects(faculty_id: Optional[str] = None, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     filt = {"faculty_id": faculty_id} if faculty_id else {}
-    docs = get_documents("subject", filt)
-    for d in docs:
-        d["_id"] = str(d["_id"])  
-    return {"items": docs}
+    return await paginate("subject", filt, limit, cursor)
 
 
 @app.get("/subjects/{subject_id}")
-def get_subject(subject_id: str):
-    try:
-        doc = db["subject"].find_one({"_id": ObjectId(subject_id)})
-        if not doc:
-            raise HTTPException(status_code=404, detail="Subject not found")
-        doc["_id"] = str(doc["_id"]) 
-        return doc
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid subject id")
+@cache(expire=60, namespace="subject", coder=MongoJsonCoder)
+async def get_subject(subject_id: str = Path(pattern=OBJECT_ID_PATTERN)):
+    doc = await db["subject"].find_one({"_id": ObjectId(subject_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    return doc
 
 
 # ---------- Enrollments ----------
+# Template for a tuition bill line; copied with per-call overrides rather
+# than rebuilt field-by-field on every enrollment.
+_BILL_LINE_TEMPLATE = {"subject_id": None, "description": "Tuition for subject", "amount": 0.0}
+
+# Aggregation expression deriving a bill's status from its totals, for use
+# in pipeline updates after total/paid change server-side.
+_BILL_STATUS_EXPR = {
+    "$switch": {
+        "branches": [
+            {"case": {"$and": [{"$gte": [{"$ifNull": ["$paid", 0]}, "$total"]}, {"$gt": ["$total", 0]}]}, "then": "paid"},
+            {"case": {"$gt": [{"$ifNull": ["$paid", 0]}, 0]}, "then": "partial"},
+        ],
+        "default": "unpaid",
+    }
+}
+
+
 @app.post("/enrollments")
-def create_enrollment(enr: EnrollmentSchema):
-    # prevent duplicate enrollment for same student/subject/semester
-    existing = list(db["enrollment"].find({
-        "student_id": enr.student_id,
-        "subject_id": enr.subject_id,
-        "semester": enr.semester,
-    }))
-    if existing:
+async def create_enrollment(enr: EnrollmentSchema):
+    # Uniqueness of (student_id, subject_id, semester) is enforced by the
+    # compound unique index created on startup, so the insert itself is the
+    # duplicate check — no pre-check round-trip, no TOCTOU race.
+    try:
+        eid = await create_document("enrollment", enr)
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Already enrolled")
 
-    eid = create_document("enrollment", enr)
-
-    # Billing: compute subject fee if available and upsert into student's bill
+    # Billing: compute subject fee if available
     fee = 0.0
     try:
-        subject = db["subject"].find_one({"_id": ObjectId(enr.subject_id)})
-        if subject:
-            units = float(subject.get("units", 0))
-            fee_per_unit = float(subject.get("fee_per_unit", 0))
-            fee = units * fee_per_unit
+        subject = await db["subject"].find_one({"_id": ObjectId(enr.subject_id)})
     except Exception:
         subject = None
-
-    bill = db["bill"].find_one({"student_id": enr.student_id, "semester": enr.semester})
-    if not bill:
-        bill_doc = BillSchema(student_id=enr.student_id, semester=enr.semester, lines=[], total=0, paid=0, status="unpaid")
-        bill_id = create_document("bill", bill_doc)
-        bill = db["bill"].find_one({"_id": ObjectId(bill_id)})
-
-    # Add bill line and recompute totals
-    line = {"subject_id": enr.subject_id, "description": "Tuition for subject", "amount": fee}
-    db["bill"].update_one({"_id": bill["_id"]}, {"$push": {"lines": line}, "$set": {"updated_at": datetime.utcnow()}})
-    bill = db["bill"].find_one({"_id": bill["_id"]})
-    total = sum(float(l.get("amount", 0)) for l in bill.get("lines", []))
-    status = "paid" if float(bill.get("paid", 0)) >= total and total > 0 else ("partial" if float(bill.get("paid", 0)) > 0 else "unpaid")
-    db["bill"].update_one({"_id": bill["_id"]}, {"$set": {"total": total, "status": status}})
+    if subject:
+        fee = float(subject.get("units", 0)) * float(subject.get("fee_per_unit", 0))
+
+    # Create-or-update the bill and rederive status in one pipeline upsert:
+    # append the line, increment total and recompute status server-side
+    line = _BILL_LINE_TEMPLATE | {"subject_id": enr.subject_id, "amount": fee}
+    await db["bill"].update_one(
+        {"student_id": enr.student_id, "semester": enr.semester},
+        [
+            {"$set": {
+                "lines": {"$concatArrays": [{"$ifNull": ["$lines", []]}, [line]]},
+                "total": {"$add": [{"$ifNull": ["$total", 0]}, fee]},
+                "paid": {"$ifNull": ["$paid", 0]},
+                "created_at": {"$ifNull": ["$created_at", "$$NOW"]},
+                "updated_at": "$$NOW",
+            }},
+            {"$set": {"status": _BILL_STATUS_EXPR}},
+        ],
+        upsert=True,
+    )
 
     return {"id": eid}
 
 
 @app.get("/enrollments")
-def list_enrollments(student_id: Optional[str] = None, subject_id: Optional[str] = None, semester: Optional[str] = None):
+async def list_enrollments(student_id: Optional[str] = None, subject_id: Optional[str] = None, semester: Optional[str] = None, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     filt = {}
     if student_id:
         filt["student_id"] = student_id
@@ -156,10 +325,7 @@ def list_enrollments(student_id: Optional[str] = None, subject_id: Optional[str]
         filt["subject_id"] = subject_id
     if semester:
         filt["semester"] = semester
-    docs = get_documents("enrollment", filt)
-    for d in docs:
-        d["_id"] = str(d["_id"]) 
-    return {"items": docs}
+    return stream_page("enrollment", filt, limit, cursor)
 
 
 # ---------- Attendance (Faculty) ----------
@@ -171,65 +337,80 @@ class AttendanceCreate(BaseModel):
 
 
 @app.post("/attendance")
-def create_attendance(payload: AttendanceCreate):
-    aid = create_document("attendance", payload.model_dump())
+async def create_attendance(payload: AttendanceCreate):
+    aid = await create_document("attendance", payload.model_dump())
     return {"id": aid}
 
 
+@app.post("/attendance/bulk")
+async def create_attendance_bulk(payloads: List[AttendanceCreate]):
+    # Batch all sessions into one insert_many instead of one insert per
+    # call; ordered=False lets the server apply them in parallel
+    if not payloads:
+        return {"ids": []}
+    now = datetime.utcnow()
+    docs = [p.model_dump() | {"created_at": now, "updated_at": now} for p in payloads]
+    result = await db["attendance"].insert_many(docs, ordered=False)
+    return {"ids": [str(i) for i in result.inserted_ids]}
+
+
 @app.get("/attendance")
-def list_attendance(subject_id: Optional[str] = None, faculty_id: Optional[str] = None):
+async def list_attendance(subject_id: Optional[str] = None, faculty_id: Optional[str] = None, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     filt = {}
     if subject_id:
         filt["subject_id"] = subject_id
     if faculty_id:
         filt["faculty_id"] = faculty_id
-    docs = get_documents("attendance", filt)
-    for d in docs:
-        d["_id"] = str(d["_id"]) 
-    return {"items": docs}
+    return stream_page("attendance", filt, limit, cursor)
 
 
 # ---------- Billing (Student/Cashier) ----------
 @app.get("/bills")
-def list_bills(student_id: Optional[str] = None, status: Optional[str] = None):
+async def list_bills(student_id: Optional[str] = None, status: Optional[str] = None, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
     filt = {}
     if student_id:
         filt["student_id"] = student_id
     if status:
         filt["status"] = status
-    docs = get_documents("bill", filt)
-    for d in docs:
-        d["_id"] = str(d["_id"]) 
-    return {"items": docs}
+    # List views don't need every line item; keeps wire size independent of
+    # how many subjects a student enrolled in
+    return await paginate("bill", filt, limit, cursor, projection={"lines": 0})
 
 
 class PaymentCreate(BaseModel):
-    bill_id: str
+    bill_id: ObjectIdStr
     amount: float
     cashier_id: str
 
 
 @app.post("/payments")
-def create_payment(payload: PaymentCreate):
-    bill = db["bill"].find_one({"_id": ObjectId(payload.bill_id)})
+async def create_payment(payload: PaymentCreate):
+    # One pipeline update adds the amount and rederives status atomically
+    # server-side; no read-modify-write race and one fewer round-trip
+    bill = await db["bill"].find_one_and_update(
+        {"_id": ObjectId(payload.bill_id)},
+        [
+            {"$set": {"paid": {"$add": [{"$ifNull": ["$paid", 0]}, payload.amount]}, "updated_at": "$$NOW"}},
+            {"$set": {"status": _BILL_STATUS_EXPR}},
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
     if not bill:
         raise HTTPException(status_code=404, detail="Bill not found")
-    pid = create_document("payment", {"bill_id": payload.bill_id, "amount": payload.amount, "cashier_id": payload.cashier_id, "paid_at": datetime.utcnow()})
-    paid = float(bill.get("paid", 0)) + float(payload.amount)
-    status = "paid" if paid >= float(bill.get("total", 0)) and float(bill.get("total", 0)) > 0 else ("partial" if paid > 0 else "unpaid")
-    db["bill"].update_one({"_id": bill["_id"]}, {"$set": {"paid": paid, "status": status, "updated_at": datetime.utcnow()}})
+    pid = await create_document("payment", {"bill_id": payload.bill_id, "amount": payload.amount, "cashier_id": payload.cashier_id, "paid_at": datetime.utcnow()})
     return {"id": pid}
 
 
 # ---------- Utilities ----------
 @app.get("/schema")
+@cache(expire=3600)
 def get_schema():
     # Expose schemas to the database viewer if present
     return {"schemas": ["user", "subject", "enrollment", "attendance", "bill", "payment"]}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -246,7 +427,7 @@ def test_database():
             response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -262,4 +443,11 @@ def test_database():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+    )
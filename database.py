@@ -1,11 +1,11 @@
 """
 Database Helper Functions
 
-MongoDB helper functions ready to use in your backend code.
+Async MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
@@ -22,34 +22,78 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    # Motor connects lazily, so creating the client here is cheap; the pool
+    # is only established once the first operation is awaited. The pool is
+    # sized explicitly: waitQueueTimeoutMS fails fast instead of queuing for
+    # 30s when all connections are checked out, and a short
+    # serverSelectionTimeoutMS surfaces an unreachable server quickly.
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=50,
+        minPoolSize=10,
+        waitQueueTimeoutMS=5000,
+        serverSelectionTimeoutMS=3000,
+    )
     db = _client[database_name]
 
+def get_client():
+    """Return the shared Motor client (e.g. to attach to app.state)."""
+    return _client
+
+def close_client():
+    """Close the Motor client and its connection pool (call on shutdown)."""
+    if _client is not None:
+        _client.close()
+
+async def ensure_indexes():
+    """Create the indexes backing every query filter shape (call on startup).
+
+    Each index turns the collection scans issued by the list endpoints, the
+    login email lookup and the enrollment duplicate check into B-tree lookups.
+    The compound enrollment index is unique so it also enforces the
+    one-enrollment-per-student/subject/semester rule at the database level.
+    """
+    if db is None:
+        return
+    await db["user"].create_index("email", unique=True)
+    await db["user"].create_index("role")
+    await db["enrollment"].create_index(
+        [("student_id", 1), ("subject_id", 1), ("semester", 1)], unique=True
+    )
+    await db["subject"].create_index("faculty_id")
+    await db["bill"].create_index([("student_id", 1), ("semester", 1)])
+    await db["bill"].create_index("status")
+    await db["attendance"].create_index([("subject_id", 1), ("faculty_id", 1)])
+    await db["payment"].create_index("bill_id")
+
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
-    # Convert Pydantic model to dict if needed
+    # Convert Pydantic model to dict if needed; mode="python" keeps native
+    # types (datetime, etc.) for the BSON encoder instead of JSON strings
     if isinstance(data, BaseModel):
-        data_dict = data.model_dump()
+        data_dict = data.model_dump(mode="python")
     else:
         data_dict = data.copy()
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None, sort: list = None):
+    """Get documents from collection, optionally projecting a subset of fields"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+
+    return await cursor.to_list(length=limit)